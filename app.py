@@ -1,16 +1,79 @@
+from __future__ import annotations
+
+import hashlib
 import os
+import threading
+import time
+from collections import OrderedDict
+from itertools import chain
 from pathlib import Path
+from typing import TYPE_CHECKING
 
 import streamlit as st
-from google import genai
-from google.genai import types
+
+if TYPE_CHECKING:
+    from google import genai
+    from google.genai import types
 
 APP_TITLE = "Critique"
 DEFAULT_MODEL = "gemini-3-flash-preview"
+MODEL_NAME = os.getenv("CRITIQUE_MODEL", DEFAULT_MODEL)
+APP_CAPTION = "Multimodal UX critique for screenshots, flows, URLs, and public Figma links."
+MODEL_CAPTION = f"Model: {MODEL_NAME}"
+# Per-depth output caps, at or below the original 2500. Thinking is bounded
+# separately by THINKING_BUDGET so it cannot use up the whole cap.
+MAX_OUTPUT_TOKENS = {
+    "Brief": 1200,
+    "Standard": 2000,
+    "Deep": 2500,
+}
+THINKING_BUDGET = 512
+TEMPERATURE = 0.6
+DEPTH_GUIDANCE = {
+    "Brief": "Keep each section of the required format to two or three short bullets.",
+    "Standard": "Cover each section of the required format in a short paragraph or a few bullets.",
+    "Deep": "Cover each section of the required format in detail, citing specific evidence from the inputs.",
+}
+CRITIQUE_MODES = (
+    "Single screen critique",
+    "Flow critique",
+    "Landing page critique",
+    "Form usability critique",
+    "Accessibility quick scan",
+)
+AUDIENCE_STYLES = (
+    "UX designer language",
+    "Plain language",
+    "Stakeholder summary",
+)
+DEPTHS = ("Brief", "Standard", "Deep")
+IMAGE_TYPES = ("png", "jpg", "jpeg", "webp")
+CRITIQUE_SCOPE_MD = """
+- visual hierarchy
+- usability and interaction clarity
+- task flow continuity
+- messaging and content clarity
+- accessibility and inclusion
+- UX tensions and research questions
+"""
+# Smallest cap that still fits a brief critique after THINKING_BUDGET.
+MIN_OUTPUT_TOKENS = 1000
+# The Advanced control may not go above the largest per-depth cap.
+MAX_OUTPUT_TOKENS_LIMIT = 2500
+RESPONSE_CACHE_SIZE = 128
+RESPONSE_CACHE_TTL = 24 * 60 * 60
+FINISH_STOP = "STOP"
+FINISH_MAX_TOKENS = "MAX_TOKENS"
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def read_identity(path: str, mtime: float) -> str:
+    return Path(path).read_text(encoding="utf-8").strip()
 
 
 def load_identity(path: str = "identity.txt") -> str:
-    return Path(path).read_text(encoding="utf-8").strip()
+    # The mtime is part of the cache key, so edits take effect on the next rerun.
+    return read_identity(path, Path(path).stat().st_mtime)
 
 
 def build_user_prompt(
@@ -25,95 +88,185 @@ def build_user_prompt(
 Critique mode: {mode}
 Audience style: {audience}
 Depth: {depth}
+Length: {DEPTH_GUIDANCE[depth]}
 
 Optional webpage URL:
-{url or "None"}
+{url.strip() or "None"}
 
 Optional Figma prototype URL:
-{figma_url or "None"}
+{figma_url.strip() or "None"}
 
 Additional context from user:
-{notes or "None"}
+{notes.strip() or "None"}
 
 Please analyze the provided inputs and return the critique in the required structured format.
 """.strip()
 
 
+@st.cache_resource(show_spinner=False)
 def get_client() -> genai.Client:
+    from google import genai
+
     api_key = st.secrets["GEMINI_API_KEY"]
     return genai.Client(api_key=api_key)
 
 
-def build_contents(prompt_text: str, uploaded_files) -> list:
+@st.cache_resource(show_spinner=False)
+def get_generation_config(
+    identity_text: str,
+    max_output_tokens: int,
+) -> types.GenerateContentConfig:
+    from google.genai import types
+
+    return types.GenerateContentConfig(
+        system_instruction=identity_text,
+        temperature=TEMPERATURE,
+        max_output_tokens=max_output_tokens,
+        thinking_config=types.ThinkingConfig(thinking_budget=THINKING_BUDGET),
+    )
+
+
+def read_images(uploaded_files) -> tuple:
+    return tuple((file.getvalue(), file.type) for file in uploaded_files)
+
+
+def build_contents(prompt_text: str, images: tuple) -> list:
+    from google.genai import types
+
     contents = [prompt_text]
 
-    for file in uploaded_files:
-        image_bytes = file.read()
+    for image_bytes, mime_type in images:
         contents.append(
             types.Part.from_bytes(
                 data=image_bytes,
-                mime_type=file.type,
+                mime_type=mime_type,
             )
         )
 
     return contents
 
 
-def generate_critique(identity_text: str, prompt_text: str, uploaded_files):
+@st.cache_resource(show_spinner=False)
+def get_response_cache() -> tuple[threading.Lock, OrderedDict]:
+    # Shared by every session thread; hold the lock for any access.
+    return threading.Lock(), OrderedDict()
+
+
+def response_cache_key(
+    identity_text: str,
+    prompt_text: str,
+    images: tuple,
+    max_output_tokens: int,
+) -> str:
+    digest = hashlib.sha256()
+    # Everything that shapes the response is hashed, so a change of model or
+    # generation settings never serves a critique produced under the old ones.
+    for text in (
+        MODEL_NAME,
+        str(TEMPERATURE),
+        str(THINKING_BUDGET),
+        identity_text,
+        prompt_text,
+        str(max_output_tokens),
+    ):
+        digest.update(text.encode("utf-8"))
+        digest.update(b"\0")
+
+    for image_bytes, mime_type in images:
+        digest.update(f"{mime_type}:{len(image_bytes)}".encode("utf-8"))
+        digest.update(image_bytes)
+
+    return digest.hexdigest()
+
+
+def get_cached_critique(key: str) -> str | None:
+    lock, cache = get_response_cache()
+    with lock:
+        entry = cache.get(key)
+        if entry is None:
+            return None
+
+        stored_at, text = entry
+        if time.monotonic() - stored_at > RESPONSE_CACHE_TTL:
+            del cache[key]
+            return None
+
+        cache.move_to_end(key)
+        return text
+
+
+def store_critique(key: str, text: str) -> None:
+    if not isinstance(text, str) or not text:
+        raise ValueError("Only non-empty critique text can be cached.")
+
+    lock, cache = get_response_cache()
+    with lock:
+        cache[key] = (time.monotonic(), text)
+        cache.move_to_end(key)
+        while len(cache) > RESPONSE_CACHE_SIZE:
+            cache.popitem(last=False)
+
+
+def stream_critique(
+    identity_text: str,
+    prompt_text: str,
+    images: tuple,
+    max_output_tokens: int,
+    stream_state: dict,
+):
+    # stream_state["finish_reason"] ends up holding the last reported reason,
+    # e.g. "STOP" or "MAX_TOKENS"; None means the stream never reported one.
+    # stream_state["block_reason"] is set when the prompt itself was blocked.
+    stream_state["finish_reason"] = None
+    stream_state["block_reason"] = None
     client = get_client()
 
-    contents = build_contents(prompt_text, uploaded_files)
+    contents = build_contents(prompt_text, images)
 
-    response = client.models.generate_content(
-        model=DEFAULT_MODEL,
+    stream = client.models.generate_content_stream(
+        model=MODEL_NAME,
         contents=contents,
-        config=types.GenerateContentConfig(
-            system_instruction=identity_text,
-            temperature=0.6,
-            max_output_tokens=2500,
-        ),
+        config=get_generation_config(identity_text, max_output_tokens),
     )
-    return response.text
+    for chunk in stream:
+        if chunk.prompt_feedback and chunk.prompt_feedback.block_reason:
+            stream_state["block_reason"] = chunk.prompt_feedback.block_reason
+        if chunk.candidates and chunk.candidates[0].finish_reason:
+            stream_state["finish_reason"] = chunk.candidates[0].finish_reason
+        if chunk.text:
+            yield chunk.text
 
 
 def main():
     st.set_page_config(page_title=APP_TITLE, layout="wide")
     st.title(APP_TITLE)
-    st.caption("Multimodal UX critique for screenshots, flows, URLs, and public Figma links.")
+    st.caption(APP_CAPTION)
 
     identity_text = load_identity()
 
     with st.sidebar:
         st.header("Critique Settings")
-        mode = st.selectbox(
-            "Mode",
-            [
-                "Single screen critique",
-                "Flow critique",
-                "Landing page critique",
-                "Form usability critique",
-                "Accessibility quick scan",
-            ],
-        )
-        audience = st.selectbox(
-            "Audience style",
-            [
-                "UX designer language",
-                "Plain language",
-                "Stakeholder summary",
-            ],
-        )
-        depth = st.selectbox(
-            "Depth",
-            ["Brief", "Standard", "Deep"],
-        )
+        mode = st.selectbox("Mode", CRITIQUE_MODES)
+        audience = st.selectbox("Audience style", AUDIENCE_STYLES)
+        depth = st.selectbox("Depth", DEPTHS)
+
+        with st.expander("Advanced"):
+            max_output_tokens = st.number_input(
+                "Max output tokens",
+                min_value=MIN_OUTPUT_TOKENS,
+                max_value=MAX_OUTPUT_TOKENS_LIMIT,
+                value=MAX_OUTPUT_TOKENS[depth],
+                step=100,
+            )
+
+        st.caption(MODEL_CAPTION)
 
     col1, col2 = st.columns(2)
 
     with col1:
         uploaded_files = st.file_uploader(
             "Upload screenshots",
-            type=["png", "jpg", "jpeg", "webp"],
+            type=IMAGE_TYPES,
             accept_multiple_files=True,
         )
 
@@ -125,14 +278,7 @@ def main():
 
     with col2:
         st.markdown("### What this tool critiques")
-        st.markdown("""
-- visual hierarchy
-- usability and interaction clarity
-- task flow continuity
-- messaging and content clarity
-- accessibility and inclusion
-- UX tensions and research questions
-        """)
+        st.markdown(CRITIQUE_SCOPE_MD)
 
     if run:
         prompt_text = build_user_prompt(
@@ -144,13 +290,58 @@ def main():
             notes=notes,
         )
 
-        with st.spinner("Generating critique..."):
-            try:
-                result = generate_critique(identity_text, prompt_text, uploaded_files or [])
+        images = read_images(uploaded_files or [])
+        cache_key = response_cache_key(identity_text, prompt_text, images, max_output_tokens)
+
+        try:
+            result = get_cached_critique(cache_key)
+            if result is not None:
                 st.markdown("## Critique")
+                st.caption("Cached result. Nothing was regenerated.")
                 st.markdown(result)
-            except Exception as e:
-                st.error(f"Error: {e}")
+            else:
+                # Keep the spinner up only until the first chunk arrives.
+                with st.spinner("Generating critique..."):
+                    stream_state = {}
+                    stream = stream_critique(
+                        identity_text,
+                        prompt_text,
+                        images,
+                        max_output_tokens,
+                        stream_state,
+                    )
+                    first_chunk = next(stream, "")
+
+                st.markdown("## Critique")
+                result = st.write_stream(chain([first_chunk], stream))
+                # Empty streams come back from write_stream as a list, and
+                # anything not finished with STOP may be blocked or cut off.
+                if (
+                    isinstance(result, str)
+                    and result
+                    and stream_state["finish_reason"] == FINISH_STOP
+                ):
+                    store_critique(cache_key, result)
+                elif stream_state["finish_reason"] == FINISH_MAX_TOKENS:
+                    st.warning(
+                        "The critique hit the output-token limit and may be incomplete. "
+                        "Raise Max output tokens under Advanced and generate again."
+                    )
+                else:
+                    block_reason = stream_state["block_reason"]
+                    finish_reason = stream_state["finish_reason"]
+                    if block_reason:
+                        reason = f"prompt blocked: {getattr(block_reason, 'value', block_reason)}"
+                    elif finish_reason:
+                        reason = f"finish reason: {getattr(finish_reason, 'value', finish_reason)}"
+                    else:
+                        reason = "no finish reason reported"
+                    st.warning(
+                        f"No complete critique was returned ({reason}). "
+                        "Adjust the inputs and generate again."
+                    )
+        except Exception as e:
+            st.error(f"Error: {e}")
 
 
 if __name__ == "__main__":